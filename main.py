@@ -1,6 +1,12 @@
 import os
 import asyncio
-from flask import Flask, request
+import logging
+from contextlib import asynccontextmanager
+
+import orjson
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 
 from aiogram import Bot, Dispatcher
 from aiogram.filters import Command
@@ -11,33 +17,98 @@ if not TOKEN:
     raise RuntimeError("Missing BOT_TOKEN env var")
 
 WEBHOOK_PATH = "/webhook"
+SHARDS = 8
+# повний шард має встигнути дообробитись за DRAIN_TIMEOUT (< 30 с до SIGKILL на Heroku)
+SHARD_SIZE = 32
+DRAIN_TIMEOUT = 25
 
 bot = Bot(token=TOKEN)
 dp = Dispatcher()
 
+# вебхук лише кладе апдейти в чергу шарда, обробляють їх воркери
+shards: list[asyncio.Queue] = []
+tasks: list[asyncio.Task] = []
+
 @dp.message(Command("start"))
 async def cmd_start(message: Message):
     await message.answer("Працюю ✅ (aiogram + webhook)")
 
-app = Flask(__name__)
+def chat_key(data: dict) -> int:
+    # id чату (або автора/користувача, напр. у poll_answer) — апдейти одного чату йдуть в один шард по черзі
+    for value in data.values():
+        if isinstance(value, dict):
+            message = value.get("message") or {}
+            chat = value.get("chat") or (message.get("chat") if isinstance(message, dict) else None) or value.get("from") or value.get("user")
+            if isinstance(chat, dict):
+                return chat.get("id", 0)
+    return 0
 
-@app.get("/")
-def index():
-    return "Bot is alive"
+def route(raw: bytes) -> tuple[dict, asyncio.Queue] | None:
+    try:
+        data = orjson.loads(raw)
+        if not isinstance(data, dict):
+            raise ValueError("update is not an object")
+        return data, shards[chat_key(data) % SHARDS]
+    except Exception:
+        logging.warning("Malformed update dropped", exc_info=True)
+        return None
 
-@app.post(WEBHOOK_PATH)
-def webhook():
-    upd = Update.model_validate(request.get_json(force=True))
-    asyncio.get_event_loop().create_task(dp.feed_update(bot, upd))
-    return "ok"
+async def worker(queue: asyncio.Queue):
+    while True:
+        data = await queue.get()
+        try:
+            await dp.feed_update(bot, Update.model_validate(data, context={"bot": bot}))
+        except Exception:
+            logging.exception("Update %s failed", data.get("update_id"))
+        finally:
+            queue.task_done()
 
 async def startup():
-    # aiogram не потребує окремого start для webhook-режиму
-    pass
+    shards.extend(asyncio.Queue(maxsize=SHARD_SIZE) for _ in range(SHARDS))
+    tasks.extend(asyncio.create_task(worker(q)) for q in shards)
+
+async def shutdown():
+    # за ці апдейти Telegram уже отримав 200, тож спершу дообробляємо чергу
+    try:
+        await asyncio.wait_for(asyncio.gather(*(q.join() for q in shards)), DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        pass
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    dropped = [q.get_nowait().get("update_id") for q in shards for _ in range(q.qsize())]
+    if dropped:
+        logging.warning("Shutdown dropped %d queued updates: %s", len(dropped), dropped)
+    await bot.session.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup()
+    yield
+    await shutdown()
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+@app.get("/")
+async def index():
+    return PlainTextResponse("Bot is alive")
+
+@app.post(WEBHOOK_PATH)
+async def webhook(req: Request):
+    routed = route(await req.body())
+    if routed is None:
+        return PlainTextResponse("ok")
+    data, shard = routed
+    try:
+        shard.put_nowait(data)
+    except asyncio.QueueFull:
+        # зайнятий лише цей шард, Telegram повторить доставку пізніше
+        return PlainTextResponse("busy", status_code=429)
+    return PlainTextResponse("ok")
 
 def main():
-    asyncio.run(startup())
-    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
+    # uvloop і httptools підхоплюються автоматично, якщо встановлені
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
 
 if __name__ == "__main__":
     main()